@@ -0,0 +1,238 @@
+import time
+
+from solution import check_budget
+from utils import ALL_NUMS, BOXES, PEERS, UNITS, grid_values, values_grid
+
+# Default wall clock budget in seconds for the search behind is_solvable. A
+# search node costs tens of microseconds, which is enough for ordinary boards;
+# the search may overrun it by the cost of one node. An unfinished search is
+# resumed by the next call.
+SOLVABLE_TIMEOUT = 0.005
+
+# Peers in a fixed order, so propagation and the reasons it records do not
+# depend on set iteration order.
+PEER_LISTS = {box: sorted(PEERS[box]) for box in BOXES}
+
+
+class SudokuSession(object):
+    """Stateful solving session for interactive play.
+
+    The session keeps the fully propagated candidate board. A move only
+    propagates outwards from the changed box through PEERS and UNITS, instead
+    of re-running grid_values, reduce_puzzle and search on the whole puzzle.
+    Each move saves the previous state so undo is a constant-time restore.
+    """
+
+    def __init__(self, grid):
+        """Starts a session from a puzzle.
+        Args:
+            grid(string): A grid in string form.
+        """
+        self.values = dict.fromkeys(BOXES, ALL_NUMS)
+        # box -> name of the constraint that determined it by propagation
+        self.reasons = dict()
+        # boxes filled in by the puzzle or the user
+        self.entered = dict()
+        self.contradiction = False
+        self._solution = None
+        # stack of candidate boards of an unfinished is_solvable search
+        self._search = None
+        self._history = []
+        for box, value in grid_values(grid).items():
+            if len(value) == 1:
+                self._enter(box, value)
+        self.givens = set(self.entered)
+
+    def move(self, box, value):
+        """Fills in a box and propagates the consequences.
+        Args:
+            box: Box to fill in, e.g. 'A1'.
+            value: Digit to place in the box.
+        Returns:
+            True if the board is still consistent after propagation.
+        """
+        if box not in self.values:
+            raise ValueError('unknown box %r' % box)
+        if value not in ALL_NUMS or len(value) != 1:
+            raise ValueError('invalid value %r' % value)
+        if box in self.entered:
+            raise ValueError('box %s is already filled in' % box)
+        self._history.append((
+            box,
+            self.values.copy(),
+            self.reasons.copy(),
+            self.contradiction,
+            self._solution,
+        ))
+        self._enter(box, value)
+        return not self.contradiction
+
+    def undo(self):
+        """Reverts the last move.
+        Returns:
+            The box that was cleared, or None if there is nothing to undo.
+        """
+        if not self._history:
+            return None
+        (box, self.values, self.reasons,
+         self.contradiction, self._solution) = self._history.pop()
+        del self.entered[box]
+        self._search = None
+        return box
+
+    def hint(self):
+        """Returns the next box that follows logically from the current board.
+        Returns:
+            (box, value, constraint) tuple where constraint names the function
+            in constraints.py that justifies it ('eliminate', 'only_choice' or
+            'naked_twins'), or None if no box follows by propagation alone.
+        """
+        if self.contradiction:
+            return None
+        for box in BOXES:
+            value = self.values[box]
+            if box not in self.entered and len(value) == 1:
+                return box, value, self.reasons[box]
+        return None
+
+    def is_solvable(self, timeout=SOLVABLE_TIMEOUT, max_nodes=None):
+        """Returns if the current board can still be completed.
+
+        Propagation catches most dead ends immediately. Otherwise a budgeted
+        depth-first search runs from the already propagated board, using the
+        same propagation as moves. An unfinished search is kept and resumed
+        by the next call, and its result is kept as long as the user's moves
+        agree with it.
+        Args:
+            timeout(float): wall clock budget in seconds for the search.
+            max_nodes(int): optional maximum number of search nodes.
+        Returns:
+            True or False, or None if the budget ran out before an answer.
+        """
+        if self.contradiction:
+            return False
+        if self._solution is None:
+            if self._search is None:
+                self._search = [self.values.copy()]
+            result = self._resume_search(timeout, max_nodes)
+            if result is None:
+                return None
+            self._solution = result
+            self._search = None
+        return self._solution is not False
+
+    def solution(self, timeout=SOLVABLE_TIMEOUT, max_nodes=None):
+        """Returns a solution of the current board in string form, or None
+        if there is none or the budget ran out before finding one."""
+        if not self.is_solvable(timeout=timeout, max_nodes=max_nodes):
+            return None
+        return values_grid(self._solution)
+
+    def _enter(self, box, value):
+        """Records a filled in box, propagates it and updates the cached
+        solution."""
+        self.entered[box] = value
+        self.reasons.pop(box, None)
+        self._search = None
+        if self._solution not in (None, False) and self._solution[box] != value:
+            self._solution = None
+        if not self.contradiction:
+            self.contradiction = not propagate(
+                self.values,
+                [(box, other, 'eliminate')
+                 for other in self.values[box] if other != value],
+                self.reasons,
+                self.entered,
+            )
+        if self.contradiction:
+            self._solution = False
+
+    def _resume_search(self, timeout, max_nodes):
+        """Continues the depth-first search on the stack in self._search.
+        Returns:
+            A solved board, False if there is none, or None if the budget ran
+            out first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stack = self._search
+        nodes = 0
+        while stack:
+            if max_nodes is not None and nodes >= max_nodes:
+                return None
+            if check_budget(deadline, None) is not None:
+                return None
+            nodes += 1
+            values = stack.pop()
+            unsolved = [
+                (len(box_values), box)
+                for box, box_values in values.items() if len(box_values) > 1
+            ]
+            if not unsolved:
+                return values
+            _, box = min(unsolved)
+            for value in reversed(values[box]):
+                subtree_values = values.copy()
+                eliminations = [
+                    (box, other, None) for other in values[box] if other != value
+                ]
+                if propagate(subtree_values, eliminations):
+                    stack.append(subtree_values)
+        return False
+
+
+def propagate(values, eliminations, reasons=None, entered=()):
+    """Applies a worklist of (box, value, reason) eliminations to a fixed point.
+
+    Whenever a box is left with a single value it is eliminated from its
+    peers (eliminate), whenever a value fits only one box of a unit it is
+    assigned there (only_choice), and whenever two boxes of a unit are left
+    with the same two values those are eliminated from the rest of the unit
+    (naked_twins). As in reduce_puzzle, naked twins are only applied once the
+    other two rules are exhausted.
+    Args:
+        values: Sudoku in dictionary form. Mutated in place.
+        eliminations: Iterable of (box, value, reason) tuples.
+        reasons: Optional dict of box -> name of the constraint that left the
+            box with a single value. Boxes in entered are not recorded.
+        entered: Boxes filled in by the puzzle or the user.
+    Returns:
+        False if some box or unit runs out of values; otherwise, True.
+    """
+    pending = list(eliminations)
+    pending_twins = []
+    while pending or pending_twins:
+        box, value, reason = (pending or pending_twins).pop()
+        box_values = values[box]
+        if value not in box_values:
+            continue
+        box_values = box_values.replace(value, '')
+        values[box] = box_values
+        if not box_values:
+            return False
+        if len(box_values) == 1:
+            if reasons is not None and box not in entered and box not in reasons:
+                reasons[box] = reason
+            pending.extend(
+                (peer, box_values, 'eliminate') for peer in PEER_LISTS[box]
+            )
+        elif len(box_values) == 2:
+            for unit in UNITS[box]:
+                twins = [b for b in unit if values[b] == box_values]
+                if len(twins) == 2:
+                    pending_twins.extend(
+                        (b, twin_value, 'naked_twins')
+                        for b in unit if b not in twins
+                        for twin_value in box_values
+                    )
+        for unit in UNITS[box]:
+            places = [b for b in unit if value in values[b]]
+            if not places:
+                return False
+            if len(places) == 1:
+                place = places[0]
+                if len(values[place]) > 1:
+                    pending.extend(
+                        (place, other, 'only_choice')
+                        for other in values[place] if other != value
+                    )
+    return True
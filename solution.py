@@ -1,60 +1,130 @@
+import time
+from collections import namedtuple
 from functools import reduce
 
 from constraints import eliminate, only_choice, naked_twins
 from utils import *
 
+# Structured result returned by solve/search when the search is stopped early.
+#   reason: one of 'timeout', 'max_nodes', 'cancelled'
+#   values: the reduced board with the most solved boxes seen so far; at
+#           least the reduced input board
+#   nodes: number of search nodes expanded before stopping
+BudgetExceeded = namedtuple('BudgetExceeded', ['reason', 'values', 'nodes'])
 
-def solve(grid):
+
+def solve(grid, timeout=None, max_nodes=None, cancel=None, store=None):
     """
     Find the solution to a Sudoku grid.
     Args:
         grid(string): a string representing a sudoku grid.
             Example: '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+        timeout(float): optional wall clock budget in seconds.
+        max_nodes(int): optional maximum number of search nodes to expand.
+        cancel: optional cancellation token with an is_set() method,
+            e.g. threading.Event. Setting it stops the search cooperatively.
+        store: optional SolutionStore consulted before searching. New
+            solutions are added to it if it is writable.
     Returns:
         The dictionary representation of the final sudoku grid. False if no solution exists.
+        A BudgetExceeded tuple if the search was stopped before finishing.
     """
     values = grid_values(grid)
-    return search(values)
+
+    if store is not None:
+        stored_solution = store.get(grid)
+        if stored_solution is not None:
+            return grid_values(stored_solution)
+
+    solution = search(values, timeout=timeout, max_nodes=max_nodes, cancel=cancel)
+
+    if store is not None and store.writable and isinstance(solution, dict):
+        store.put(grid, values_grid(solution))
+    return solution
 
 
-def search(values):
+def search(values, timeout=None, max_nodes=None, cancel=None):
     """
     Using depth-first search and propagation, create a search tree and solve.
     NOTE: This assumes that we only want A single solution, not ALL solutions.
+    The tree is walked with an explicit stack rather than recursion, so deep
+    trees cannot hit the interpreter's recursion limit.
     Args:
         values: Sudoku in dictionary form.
+        timeout(float): optional wall clock budget in seconds.
+        max_nodes(int): optional maximum number of search nodes to expand.
+        cancel: optional cancellation token with an is_set() method.
     Returns:
         A solution if one exists; otherwise, False
+        A BudgetExceeded tuple if the search was stopped before finishing.
     """
-    # First, reduce the puzzle using the previous function
-    reduced_values = reduce_puzzle(values)
+    deadline = None if timeout is None else time.monotonic() + timeout
 
-    # Base case when puzzle is unsolvable
-    if reduced_values is False:
+    # The root is reduced before any budget check, so an early stop still
+    # reports a reduced board.
+    root_values = reduce_puzzle(values)
+    if root_values is False:
         return False
-
-    # Choose one of the unfilled squares with the fewest possibilities
-    min_choice = get_box_with_fewest_possibilities(reduced_values)
-
-    # Base case when puzzle is already solved
-    if min_choice is None:
-        return reduced_values
-
-    min_box, possible_values = min_choice
-
-    # Now use recursion to solve each one of the resulting sudokus
-    # If one returns a value (not False), return that answer!
-    for possible_value in list(possible_values):
-        subtree_values = reduced_values.copy()
-        subtree_values[min_box] = possible_value
-        subtree_solution = search(subtree_values)
-        if subtree_solution is not False:
-            return subtree_solution
+    best_values = root_values
+    best_solved = len(get_solved_boxes(root_values))
+    nodes = 0
+
+    # Children are pushed in reverse so they are popped in the same order
+    # the recursive search would have visited them.
+    stack = [root_values]
+    while stack:
+        if max_nodes is not None and nodes >= max_nodes:
+            return BudgetExceeded('max_nodes', best_values, nodes)
+        # Every node runs a full reduce_puzzle, which costs far more than
+        # reading the clock, so the deadline is checked on every node too.
+        reason = check_budget(deadline, cancel)
+        if reason is not None:
+            return BudgetExceeded(reason, best_values, nodes)
+        nodes += 1
+
+        # First, reduce the puzzle using the previous function
+        reduced_values = reduce_puzzle(stack.pop())
+
+        # Dead end when puzzle is unsolvable
+        if reduced_values is False:
+            continue
+
+        solved = len(get_solved_boxes(reduced_values))
+        if solved > best_solved:
+            best_values, best_solved = reduced_values, solved
+
+        # Choose one of the unfilled squares with the fewest possibilities
+        min_choice = get_box_with_fewest_possibilities(reduced_values)
+
+        # Puzzle is already solved
+        if min_choice is None:
+            return reduced_values
+
+        min_box, possible_values = min_choice
+        for possible_value in reversed(possible_values):
+            subtree_values = reduced_values.copy()
+            subtree_values[min_box] = possible_value
+            stack.append(subtree_values)
 
     # Unsolvable puzzle
     return False
 
 
+def check_budget(deadline, cancel):
+    """Checks the wall clock deadline and cancellation token of a search.
+    Args:
+        deadline: time.monotonic() value after which to stop, or None.
+        cancel: cancellation token with an is_set() method, or None.
+    Returns:
+        'cancelled' or 'timeout' if the search should stop; otherwise, None.
+    """
+    if cancel is not None and cancel.is_set():
+        return 'cancelled'
+    if deadline is not None and time.monotonic() >= deadline:
+        return 'timeout'
+    return None
+
+
 def reduce_puzzle(values):
     """Iteratively reduces the puzzle using the local constraints defined.
     Args:
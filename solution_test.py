@@ -1,5 +1,12 @@
+import os
+import session
+import shutil
 import solution
+import store
+import tempfile
+import threading
 import unittest
+import utils
 
 
 class TestNakedTwins(unittest.TestCase):
@@ -94,5 +101,179 @@ class TestDiagonalSudoku(unittest.TestCase):
     def test_solve(self):
         self.assertEqual(solution.solve(self.diagonal_grid), self.solved_diag_sudoku)
 
+
+class TestSolveBudget(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+    empty_grid = '.' * 81
+
+    def test_max_nodes_exceeded(self):
+        result = solution.solve(self.empty_grid, max_nodes=1)
+        self.assertIsInstance(result, solution.BudgetExceeded)
+        self.assertEqual(result.reason, 'max_nodes')
+        self.assertEqual(result.nodes, 1)
+        self.assertEqual(len(result.values), 81)
+
+    def test_cancelled(self):
+        cancel = threading.Event()
+        cancel.set()
+        result = solution.solve(self.empty_grid, cancel=cancel)
+        self.assertIsInstance(result, solution.BudgetExceeded)
+        self.assertEqual(result.reason, 'cancelled')
+
+    def test_stopped_before_first_node_is_reduced(self):
+        values = solution.grid_values(self.diagonal_grid)
+        result = solution.search(values, max_nodes=0)
+        self.assertEqual(result.nodes, 0)
+        self.assertEqual(result.values, solution.reduce_puzzle(values))
+
+    def test_timeout(self):
+        result = solution.solve(self.empty_grid, timeout=0)
+        self.assertIsInstance(result, solution.BudgetExceeded)
+        self.assertEqual(result.reason, 'timeout')
+
+    def test_within_budget(self):
+        result = solution.solve(self.diagonal_grid, timeout=60, max_nodes=10000)
+        self.assertEqual(result, TestDiagonalSudoku.solved_diag_sudoku)
+
+
+class TestSolutionStore(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'solutions.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pack_roundtrip(self):
+        packed = store.pack_grid(self.diagonal_grid)
+        self.assertEqual(len(packed), store.PACKED_SIZE)
+        self.assertEqual(store.unpack_grid(packed), self.diagonal_grid)
+
+    def test_solve_populates_and_reads_store(self):
+        with store.SolutionStore.create(self.path, 16) as writer:
+            self.assertEqual(solution.solve(self.diagonal_grid, store=writer),
+                             TestDiagonalSudoku.solved_diag_sudoku)
+            self.assertEqual(len(writer), 1)
+        with store.SolutionStore(self.path) as reader:
+            self.assertIn(self.diagonal_grid, reader)
+            self.assertIsNone(reader.get('.' * 81))
+            self.assertEqual(solution.solve(self.diagonal_grid, store=reader),
+                             TestDiagonalSudoku.solved_diag_sudoku)
+            self.assertRaises(ValueError, reader.put, '.' * 81, '1' * 81)
+
+    def test_store_grows_when_full(self):
+        with store.SolutionStore.create(self.path, 2) as writer:
+            writer.put('1' + '.' * 80, '1' * 81)
+            self.assertTrue(writer.is_full())
+            self.assertEqual(solution.solve(self.diagonal_grid, store=writer),
+                             TestDiagonalSudoku.solved_diag_sudoku)
+            self.assertEqual(writer.capacity, 4)
+            self.assertEqual(len(writer), 2)
+        with store.SolutionStore(self.path) as reader:
+            self.assertEqual(reader.get('1' + '.' * 80), '1' * 81)
+            self.assertIn(self.diagonal_grid, reader)
+
+    def test_file_mode_follows_umask(self):
+        umask = os.umask(0o022)
+        try:
+            store.SolutionStore.create(self.path, 16).close()
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+
+    def test_invalid_grid(self):
+        with store.SolutionStore.create(self.path, 16) as writer:
+            solution.solve('.' * 81, store=writer)
+            self.assertRaises(ValueError, writer.get, 'f' * 81)
+            self.assertRaises(AssertionError, solution.solve, 'f' * 81, store=writer)
+
+    def test_single_writer(self):
+        with store.SolutionStore.create(self.path, 16):
+            self.assertRaises(ValueError, store.SolutionStore, self.path, True)
+            self.assertRaises(ValueError, store.SolutionStore.create, self.path, 16)
+            store.SolutionStore(self.path).close()
+        store.SolutionStore(self.path, writable=True).close()
+
+    def test_create_replaces_mapped_file(self):
+        with store.SolutionStore.create(self.path, 16) as writer:
+            writer.put(self.diagonal_grid, '1' * 81)
+        with store.SolutionStore(self.path) as reader:
+            store.SolutionStore.create(self.path, 16).close()
+            self.assertIn(self.diagonal_grid, reader)
+        with store.SolutionStore(self.path) as reader:
+            self.assertEqual(len(reader), 0)
+
+
+class TestSudokuSession(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+    twins_grid = '.....2.5...83.........71.9.4..85.........9..41...2..8..4......6..1..43...86.13...'
+
+    def test_hints_solve_puzzle(self):
+        game = session.SudokuSession(self.diagonal_grid)
+        hint = game.hint()
+        while hint is not None:
+            box, value, constraint = hint
+            self.assertIn(constraint, ('eliminate', 'only_choice', 'naked_twins'))
+            self.assertTrue(game.move(box, value))
+            hint = game.hint()
+        self.assertEqual(game.entered, TestDiagonalSudoku.solved_diag_sudoku)
+
+    def test_bad_move_and_undo(self):
+        game = session.SudokuSession('.' * 81)
+        self.assertTrue(game.move('A1', '1'))
+        self.assertFalse(game.move('A2', '1'))
+        self.assertFalse(game.is_solvable())
+        self.assertIsNone(game.hint())
+        self.assertEqual(game.undo(), 'A2')
+        self.assertTrue(game.is_solvable(timeout=None))
+        self.assertEqual(game.solution(timeout=None)[0], '1')
+        self.assertRaises(ValueError, game.move, 'A1', '2')
+
+    def test_solvable_unknown_within_budget(self):
+        game = session.SudokuSession('.' * 81)
+        game.move('A1', '1')
+        self.assertIsNone(game.is_solvable(max_nodes=1))
+        self.assertTrue(game.is_solvable(timeout=None))
+
+    def test_solvable_search_resumes(self):
+        game = session.SudokuSession('.' * 81)
+        game.move('A1', '1')
+        for _ in range(20):
+            if game.is_solvable(max_nodes=5) is not None:
+                break
+        self.assertTrue(game.is_solvable(max_nodes=0))
+
+    def test_solvable_with_defaults(self):
+        assignments = len(utils.assignments)
+        game = session.SudokuSession(self.twins_grid)
+        self.assertTrue(game.is_solvable())
+        solved = game.solution()
+        for box, value in zip(utils.BOXES, solved):
+            if len(game.values[box]) > 1:
+                wrong_value = next(v for v in game.values[box] if v != value)
+                break
+        game.move(box, wrong_value)
+        self.assertFalse(game.is_solvable())
+        game.undo()
+        self.assertTrue(game.is_solvable())
+        self.assertEqual(len(utils.assignments), assignments)
+
+    def test_naked_twins_hint(self):
+        # eliminate and only_choice alone stall on this board after 44 boxes
+        game = session.SudokuSession(self.twins_grid)
+        constraints = set()
+        hint = game.hint()
+        while hint is not None:
+            box, value, constraint = hint
+            constraints.add(constraint)
+            game.move(box, value)
+            hint = game.hint()
+        self.assertIn('naked_twins', constraints)
+        self.assertGreater(len(game.entered), 44)
+        self.assertTrue(game.is_solvable(timeout=None))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,279 @@
+import contextlib
+import fcntl
+import mmap
+import os
+import re
+import struct
+import tempfile
+import zlib
+
+# File layout:
+#   header: magic, capacity (number of slots, a power of two), count
+#   slots:  capacity fixed-size (key, solution) records, open addressing
+# Grids are packed two boxes per byte as hex nibbles ('.' -> 0xf), so an
+# 81 character grid takes 41 bytes. A slot whose key is all zero is empty;
+# no packed grid is all zero because the final pad nibble is always 0xf.
+MAGIC = b'SUDOKUS1'
+HEADER = struct.Struct('<8sQQ')
+PACKED_SIZE = 41
+SLOT_SIZE = 2 * PACKED_SIZE
+EMPTY_KEY = bytes(PACKED_SIZE)
+MAX_LOAD_FACTOR = 0.75
+
+_PACK_TABLE = str.maketrans('.', 'f')
+_GRID_RE = re.compile(r'^[1-9.]{81}$')
+
+
+def pack_grid(grid):
+    """Packs a grid string into its compact key form.
+    Args:
+        grid(string): A grid in string form.
+    Returns:
+        41 bytes holding one hex nibble per box.
+    """
+    if not _GRID_RE.match(grid):
+        raise ValueError('invalid grid %r' % grid)
+    return bytes.fromhex(grid.translate(_PACK_TABLE) + 'f')
+
+
+def unpack_grid(packed):
+    """Unpacks a key produced by pack_grid back into a grid string.
+    Args:
+        packed: 41 bytes produced by pack_grid.
+    Returns:
+        The grid in string form.
+    """
+    return packed.hex()[:81].replace('f', '.')
+
+
+def lock_writer(path):
+    """Takes the exclusive writer lock of a store.
+
+    The lock is held on a sibling '<path>.lock' file rather than on the store
+    itself, because create and grow replace the store file with a new one.
+    Args:
+        path: Path of the store.
+    Returns:
+        The open lock file; closing it releases the lock.
+    """
+    lock_file = open(path + '.lock', 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise ValueError('%s is already opened for writing' % path)
+    return lock_file
+
+
+class SolutionStore(object):
+    """On-disk map of puzzle grids to solution grids, accessed through mmap.
+
+    Entries are only ever added, never rewritten, so any number of processes
+    can share the file read-only while a single writer appends to it. The
+    writer holds an exclusive flock (see lock_writer), and fills in the
+    solution before the key, so a reader never observes a key without its
+    solution.
+
+    Sizing: each slot takes SLOT_SIZE (82) bytes and the table is kept at
+    most MAX_LOAD_FACTOR full, so N entries need a capacity of at least
+    N / 0.75 slots, e.g. 16M slots (about 1.3 GB) for 12M entries. When the
+    table fills up, put() doubles it with grow(), which rewrites the whole
+    file into a new one and swaps it in. Readers keep the old file mapped,
+    and see new entries once they reopen the store.
+    """
+
+    def __init__(self, path, writable=False, _lock=None):
+        """Opens an existing store.
+        Args:
+            path: Path of a file created by SolutionStore.create.
+            writable: Open for writing; otherwise, the mapping is read-only.
+                Only one process may have the store open for writing.
+        """
+        self.path = path
+        self.writable = writable
+        self._lock = None
+        if writable:
+            self._lock = _lock if _lock is not None else lock_writer(path)
+        try:
+            self._open()
+        except BaseException:
+            if self._lock is not None:
+                self._lock.close()
+            raise
+
+    @classmethod
+    def create(cls, path, capacity):
+        """Creates an empty store and opens it for writing.
+        Args:
+            path: Path of the file to create. An existing file is replaced
+                atomically, so processes that still map it are unaffected.
+                Fails if another process has the store open for writing.
+            capacity: Number of slots; rounded up to a power of two.
+        Returns:
+            A writable SolutionStore.
+        """
+        slots = _round_capacity(capacity)
+        lock = lock_writer(path)
+        try:
+            with _replace_file(path) as f:
+                f.write(HEADER.pack(MAGIC, slots, 0))
+                f.truncate(HEADER.size + slots * SLOT_SIZE)
+            return cls(path, writable=True, _lock=lock)
+        except BaseException:
+            lock.close()
+            raise
+
+    def _open(self):
+        """Maps the store file and reads its header."""
+        self._file = open(self.path, 'r+b' if self.writable else 'rb')
+        access = mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=access)
+        magic, self.capacity, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            self._file.close()
+            raise ValueError('%s is not a solution store' % self.path)
+        self._mask = self.capacity - 1
+
+    def __len__(self):
+        return HEADER.unpack_from(self._mmap, 0)[2]
+
+    def is_full(self):
+        """Returns if the store has reached its maximum load factor."""
+        return len(self) + 1 > self.capacity * MAX_LOAD_FACTOR
+
+    def __contains__(self, grid):
+        return self.get(grid) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps and closes the underlying file, releasing the writer lock."""
+        self._mmap.close()
+        self._file.close()
+        if self._lock is not None:
+            self._lock.close()
+
+    def get(self, grid):
+        """Looks up the solution of a grid.
+        Args:
+            grid(string): A grid in string form.
+        Returns:
+            The solution in string form, or None if the grid is not stored.
+        """
+        key = pack_grid(grid)
+        offset = _find_slot(self._mmap, self._mask, key)
+        value_offset = offset + PACKED_SIZE
+        if self._mmap[offset:value_offset] != key:
+            return None
+        value = self._mmap[value_offset:value_offset + PACKED_SIZE]
+        return unpack_grid(value)
+
+    def put(self, grid, solution):
+        """Stores the solution of a grid. Existing entries are left as is.
+        The table is doubled with grow() first if it is full.
+        Args:
+            grid(string): A grid in string form.
+            solution(string): The solved grid in string form.
+        """
+        if not self.writable:
+            raise ValueError('store is opened read-only')
+        key = pack_grid(grid)
+        value = pack_grid(solution)
+        offset = _find_slot(self._mmap, self._mask, key)
+        if self._mmap[offset:offset + PACKED_SIZE] == key:
+            return
+        if self.is_full():
+            self.grow(2 * self.capacity)
+            offset = _find_slot(self._mmap, self._mask, key)
+        _write_slot(self._mmap, offset, key, value)
+        HEADER.pack_into(self._mmap, 0, MAGIC, self.capacity, len(self) + 1)
+
+    def grow(self, capacity):
+        """Rehashes all entries into a larger table and swaps it in.
+        Args:
+            capacity: New number of slots; rounded up to a power of two.
+        """
+        if not self.writable:
+            raise ValueError('store is opened read-only')
+        slots = _round_capacity(capacity)
+        if slots <= self.capacity:
+            return
+        count = len(self)
+        with _replace_file(self.path) as f:
+            f.write(HEADER.pack(MAGIC, slots, count))
+            f.truncate(HEADER.size + slots * SLOT_SIZE)
+            f.flush()
+            new_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+            try:
+                old_mmap = self._mmap
+                end = HEADER.size + self.capacity * SLOT_SIZE
+                for offset in range(HEADER.size, end, SLOT_SIZE):
+                    value_offset = offset + PACKED_SIZE
+                    key = old_mmap[offset:value_offset]
+                    if key == EMPTY_KEY:
+                        continue
+                    value = old_mmap[value_offset:value_offset + PACKED_SIZE]
+                    new_offset = _find_slot(new_mmap, slots - 1, key)
+                    _write_slot(new_mmap, new_offset, key, value)
+                new_mmap.flush()
+            finally:
+                new_mmap.close()
+        self._mmap.close()
+        self._file.close()
+        self._open()
+
+    def flush(self):
+        """Flushes pending writes to disk."""
+        self._mmap.flush()
+
+
+
+def _round_capacity(capacity):
+    """Rounds a capacity up to a power of two."""
+    slots = 1
+    while slots < capacity:
+        slots *= 2
+    return slots
+
+
+def _find_slot(table, mask, key):
+    """Returns the offset of the slot holding key, or of the empty slot
+    where it would be inserted, using linear probing."""
+    index = zlib.crc32(key) & mask
+    while True:
+        offset = HEADER.size + index * SLOT_SIZE
+        slot_key = table[offset:offset + PACKED_SIZE]
+        if slot_key == key or slot_key == EMPTY_KEY:
+            return offset
+        index = (index + 1) & mask
+
+
+def _write_slot(table, offset, key, value):
+    """Writes an entry into an empty slot, solution first so readers never
+    see a key without its solution."""
+    value_offset = offset + PACKED_SIZE
+    table[value_offset:value_offset + PACKED_SIZE] = value
+    table[offset:value_offset] = key
+
+
+@contextlib.contextmanager
+def _replace_file(path):
+    """Yields a temporary file next to path, which replaces path atomically
+    once the block completes. The file gets the usual umask permissions
+    rather than mkstemp's 0600, so other users can still read the store."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    try:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.fchmod(fd, 0o666 & ~umask)
+        with os.fdopen(fd, 'w+b') as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -37,6 +37,17 @@ def grid_values(grid):
     }
 
 
+def values_grid(values):
+    """
+    Convert a solved grid from dict form back into string form.
+    Args:
+        values(dict): The sudoku in dictionary form, with one value per box.
+    Returns:
+        A grid in string form.
+    """
+    return ''.join(values[box] for box in BOXES)
+
+
 def display(values):
     """
     Display the values as a 2-D grid.